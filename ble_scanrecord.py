@@ -72,12 +72,15 @@ def parse_scan_record(ad: bytes) -> ScanRecord:
     """Parse a BLE advertisement (AdvData or ScanRsp payload) into a ScanRecord."""
     i = 0
     sr = ScanRecord(raw=ad)
-    while i < len(ad):
-        length = ad[i]
+    # Walk the TLVs through a memoryview so per-field slices don't copy;
+    # only payloads stored on the ScanRecord are materialized as bytes.
+    mv = memoryview(ad)
+    while i < len(mv):
+        length = mv[i]
         if length == 0:
             break
-        ad_type = ad[i+1]
-        value = ad[i+2:i+1+length]
+        ad_type = mv[i+1]
+        value = mv[i+2:i+1+length]
         # Dispatch
         if ad_type in (_AD_UUID16_INCOMPLETE, _AD_UUID16_COMPLETE):
             sr.service_uuids.extend(_parse_uuid_list(value, 2))
@@ -87,7 +90,7 @@ def parse_scan_record(ad: bytes) -> ScanRecord:
             sr.service_uuids.extend(_parse_uuid_list(value, 16))
         elif ad_type in (_AD_LOCAL_NAME_SHORT, _AD_LOCAL_NAME_COMPLETE):
             try:
-                sr.local_name = value.decode("utf-8", errors="ignore")
+                sr.local_name = bytes(value).decode("utf-8", errors="ignore")
             except Exception:
                 sr.local_name = None
         elif ad_type == _AD_TX_POWER:
@@ -105,19 +108,19 @@ def parse_scan_record(ad: bytes) -> ScanRecord:
         elif ad_type == _AD_MANUFACTURER_SPECIFIC_DATA:
             if len(value) >= 2:
                 company_id = struct.unpack("<H", value[:2])[0]
-                sr.manufacturer_data[company_id] = value[2:]
+                sr.manufacturer_data[company_id] = bytes(value[2:])
         elif ad_type in (_AD_SERVICE_DATA_16, _AD_SERVICE_DATA_32, _AD_SERVICE_DATA_128):
             if ad_type == _AD_SERVICE_DATA_16 and len(value) >= 2:
                 (svc16,) = struct.unpack("<H", value[:2])
                 u = _uuid_from_16(svc16)
-                sr.service_data[u] = value[2:]
+                sr.service_data[u] = bytes(value[2:])
             elif ad_type == _AD_SERVICE_DATA_32 and len(value) >= 4:
                 (svc32,) = struct.unpack("<I", value[:4])
                 u = _uuid_from_32(svc32)
-                sr.service_data[u] = value[4:]
+                sr.service_data[u] = bytes(value[4:])
             elif ad_type == _AD_SERVICE_DATA_128 and len(value) >= 16:
                 u = _bytes_to_uuid_le_128(value[:16])
-                sr.service_data[u] = value[16:]
+                sr.service_data[u] = bytes(value[16:])
         # advance
         i += 1 + length
     return sr
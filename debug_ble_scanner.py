@@ -8,6 +8,8 @@ from bleak import BleakScanner
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+KEGSCALE_SERVICE_UUID = "0000e4be-0000-1000-8000-00805f9b34fb"
+
 class DebugBLEScanner:
     def __init__(self):
         self.scan_count = 0
@@ -35,7 +37,7 @@ class DebugBLEScanner:
             print("Service Data:")
             for uuid, data in advertisement_data.service_data.items():
                 print(f"  {uuid}: {data.hex()}")
-                if str(uuid).lower() == "0000e4be-0000-1000-8000-00805f9b34fb":
+                if str(uuid).lower() == KEGSCALE_SERVICE_UUID:
                     print(f"  *** KEGSCALE SERVICE FOUND! ***")
         
         # Show manufacturer data
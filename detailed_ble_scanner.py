@@ -8,6 +8,8 @@ from bleak import BleakScanner
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+KEGSCALE_SERVICE_UUID = "0000e4be-0000-1000-8000-00805f9b34fb"
+
 class DetailedBLEScanner:
     def __init__(self):
         self.device_count = 0
@@ -28,9 +30,8 @@ class DetailedBLEScanner:
             print(f"Service UUIDs: {advertisement_data.service_uuids}")
             
             # Check for KegScale UUID
-            target_uuid = "0000e4be-0000-1000-8000-00805f9b34fb"
             for uuid in advertisement_data.service_uuids:
-                if str(uuid).lower() == target_uuid.lower():
+                if str(uuid).lower() == KEGSCALE_SERVICE_UUID:
                     print("*** KEGSCALE SERVICE UUID FOUND! ***")
                     self.kegscale_found = True
         
@@ -41,7 +42,7 @@ class DetailedBLEScanner:
                 print(f"  {uuid}: {data.hex()}")
                 
                 # Check for KegScale service data
-                if str(uuid).lower() == "0000e4be-0000-1000-8000-00805f9b34fb":
+                if str(uuid).lower() == KEGSCALE_SERVICE_UUID:
                     print("*** KEGSCALE SERVICE DATA FOUND! ***")
                     print(f"  Data length: {len(data)} bytes")
                     print(f"  Raw data: {data.hex()}")
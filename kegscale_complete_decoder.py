@@ -5,33 +5,56 @@ Decodes KegScale BLE beacon data without requiring additional libraries.
 Based on logic extracted from the KegMaster Android app.
 """
 
+import array
 import struct
 import json
 from datetime import datetime
 
 
+# Battery millivolt thresholds from the KegMaster app; index == percentage.
+# Shared by every KegScaleDecoder instance.
+_BATTERY_VOLTAGES = array.array('H', [
+    3165, 3246, 3293, 3327, 3353, 3374, 3392, 3408, 3422, 3434,  # 0-9%
+    3445, 3455, 3465, 3473, 3481, 3489, 3496, 3502, 3506, 3514,  # 10-19%
+    3522, 3531, 3539, 3547, 3555, 3563, 3571, 3580, 3588, 3596,  # 20-29%
+    3604, 3612, 3620, 3629, 3637, 3645, 3653, 3661, 3669, 3678,  # 30-39%
+    3686, 3694, 3702, 3710, 3718, 3727, 3735, 3743, 3751, 3759,  # 40-49%
+    3767, 3776, 3784, 3792, 3800, 3808, 3817, 3825, 3833, 3841,  # 50-59%
+    3849, 3857, 3866, 3874, 3882, 3890, 3898, 3906, 3915, 3923,  # 60-69%
+    3931, 3939, 3947, 3955, 3964, 3972, 3980, 3988, 3996, 4004,  # 70-79%
+    4013, 4021, 4029, 4037, 4045, 4054, 4062, 4070, 4078, 4086,  # 80-89%
+    4094, 4103, 4111, 4119, 4127, 4135, 4143, 4152, 4160, 4168   # 90-100%
+])
+
+# Centi-degree range covered by the Fahrenheit lookup table (-40.00..100.00°C)
+_TEMP_LUT_MIN = -4000
+_TEMP_LUT_MAX = 10000
+
+# Weight (int32), battery mV (uint16) and temperature (int16) at payload[13:21]
+_WEIGHT_BATTERY_TEMP = struct.Struct('<iHh')
+
+
 class KegScaleDecoder:
     def __init__(self):
         self.battery_voltage_table = self._create_battery_table()
+        self._f_from_centi = self._create_fahrenheit_table()
     
     def _create_battery_table(self):
         """
         Battery voltage to percentage lookup table from KegMaster app.
         Maps millivolt readings to battery percentage (0-100%).
         """
-        voltages = [
-            3165, 3246, 3293, 3327, 3353, 3374, 3392, 3408, 3422, 3434,  # 0-9%
-            3445, 3455, 3465, 3473, 3481, 3489, 3496, 3502, 3506, 3514,  # 10-19%
-            3522, 3531, 3539, 3547, 3555, 3563, 3571, 3580, 3588, 3596,  # 20-29%
-            3604, 3612, 3620, 3629, 3637, 3645, 3653, 3661, 3669, 3678,  # 30-39%
-            3686, 3694, 3702, 3710, 3718, 3727, 3735, 3743, 3751, 3759,  # 40-49%
-            3767, 3776, 3784, 3792, 3800, 3808, 3817, 3825, 3833, 3841,  # 50-59%
-            3849, 3857, 3866, 3874, 3882, 3890, 3898, 3906, 3915, 3923,  # 60-69%
-            3931, 3939, 3947, 3955, 3964, 3972, 3980, 3988, 3996, 4004,  # 70-79%
-            4013, 4021, 4029, 4037, 4045, 4054, 4062, 4070, 4078, 4086,  # 80-89%
-            4094, 4103, 4111, 4119, 4127, 4135, 4143, 4152, 4160, 4168   # 90-100%
-        ]
-        return voltages
+        return _BATTERY_VOLTAGES
+    
+    def _create_fahrenheit_table(self):
+        """
+        Precomputed, already-rounded Fahrenheit values indexed by
+        centi-degrees Celsius offset by _TEMP_LUT_MIN.
+        """
+        return array.array('d', (
+            self.celsius_to_fahrenheit(raw / 100.0)
+            for raw in range(_TEMP_LUT_MIN, _TEMP_LUT_MAX + 1)
+        ))
     
     def mv_to_battery_percentage(self, millivolts):
         """
@@ -75,18 +98,21 @@ class KegScaleDecoder:
         """Convert grams to kilograms."""
         return grams / 1000.0
     
-    def decode_kegscale_beacon(self, payload_hex):
+    def decode_kegscale_beacon(self, payload_hex, *, timestamp=None):
         """
         Decode KegScale BLE beacon payload from hex string.
         
         Args:
             payload_hex: Hex string of the beacon payload
+            timestamp: ISO timestamp to record; defaults to the current time
             
         Returns:
             Dictionary with decoded values
         """
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
         decoded = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp,
             "raw_payload": payload_hex,
             "payload_length": len(payload_hex) // 2
         }
@@ -123,7 +149,10 @@ class KegScaleDecoder:
                 # Temperature is likely in centidegrees Celsius (1/100th of a degree)
                 temp_celsius = temp_raw / 100.0
                 decoded["temperature_celsius"] = temp_celsius
-                decoded["temperature_fahrenheit"] = self.celsius_to_fahrenheit(temp_celsius)
+                if _TEMP_LUT_MIN <= temp_raw <= _TEMP_LUT_MAX:
+                    decoded["temperature_fahrenheit"] = self._f_from_centi[temp_raw - _TEMP_LUT_MIN]
+                else:
+                    decoded["temperature_fahrenheit"] = self.celsius_to_fahrenheit(temp_celsius)
             
             # Additional metadata
             if len(payload) >= 13:
@@ -144,6 +173,7 @@ class KegScaleDecoder:
         """
         try:
             scanrecord = bytes.fromhex(scanrecord_hex.replace(" ", ""))
+            timestamp = datetime.now().isoformat()
             
             # Parse scan record for manufacturer data
             # Manufacturer data typically starts with AD type 0xFF
@@ -166,7 +196,7 @@ class KegScaleDecoder:
                     payload = ad_data[2:]
                     
                     print(f"\nFound manufacturer data for company 0x{company_id:04X}")
-                    decoded = self.decode_kegscale_beacon(payload)
+                    decoded = self.decode_kegscale_beacon(payload, timestamp=timestamp)
                     results.append(decoded)
                 
                 i += length + 1
@@ -175,6 +205,46 @@ class KegScaleDecoder:
             
         except Exception as e:
             return [{"error": f"Scan record parsing error: {str(e)}"}]
+    
+    def decode_from_scanrecord_batched(self, scanrecords):
+        """
+        Decode many scan records into column arrays instead of per-beacon dicts.
+        
+        Args:
+            scanrecords: Iterable of scan records (bytes or hex strings)
+            
+        Returns:
+            Dictionary of parallel arrays: weight_raw (int32), battery_mv
+            (uint16) and temp_raw (int16, centi-degrees Celsius). Only
+            manufacturer payloads long enough to carry all three fields
+            are included.
+        """
+        weight_raw = array.array('i')
+        battery_mv = array.array('H')
+        temp_raw = array.array('h')
+        unpack_from = _WEIGHT_BATTERY_TEMP.unpack_from
+        min_len = 13 + _WEIGHT_BATTERY_TEMP.size
+        
+        for scanrecord in scanrecords:
+            if isinstance(scanrecord, str):
+                scanrecord = bytes.fromhex(scanrecord.replace(" ", ""))
+            i = 0
+            n = len(scanrecord)
+            while i + 1 < n:
+                length = scanrecord[i]
+                if length == 0 or i + length + 1 > n:
+                    break
+                
+                # Manufacturer data: 2-byte company ID followed by the beacon payload
+                if scanrecord[i + 1] == 0xFF and length - 3 >= min_len:
+                    w, b, t = unpack_from(scanrecord, i + 4 + 13)
+                    weight_raw.append(w)
+                    battery_mv.append(b)
+                    temp_raw.append(t)
+                
+                i += length + 1
+        
+        return {"weight_raw": weight_raw, "battery_mv": battery_mv, "temp_raw": temp_raw}
 
 
 def main():
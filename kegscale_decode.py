@@ -1,7 +1,28 @@
 from __future__ import annotations
 from typing import Dict, Any
+import array
 import struct
 
+_S_I = struct.Struct('<i')
+_S_H = struct.Struct('<H')
+_S_h = struct.Struct('<h')
+# Full-length E4BE frame: battery byte @2, temp byte @5, weight @13, battery mV @17, temp word @19
+_E4BE_FULL = struct.Struct('<2xB2xB7xiHh')
+
+# Battery millivolt thresholds from the KegMaster app; index == percentage
+_BAT_TABLE = array.array('H', [
+    3165, 3246, 3293, 3327, 3353, 3374, 3392, 3408, 3422, 3434,  # 0-9%
+    3445, 3455, 3465, 3473, 3481, 3489, 3496, 3502, 3506, 3514,  # 10-19%
+    3522, 3531, 3539, 3547, 3555, 3563, 3571, 3580, 3588, 3596,  # 20-29%
+    3604, 3612, 3620, 3629, 3637, 3645, 3653, 3661, 3669, 3678,  # 30-39%
+    3686, 3694, 3702, 3710, 3718, 3727, 3735, 3743, 3751, 3759,  # 40-49%
+    3767, 3776, 3784, 3792, 3800, 3808, 3817, 3825, 3833, 3841,  # 50-59%
+    3849, 3857, 3866, 3874, 3882, 3890, 3898, 3906, 3915, 3923,  # 60-69%
+    3931, 3939, 3947, 3955, 3964, 3972, 3980, 3988, 3996, 4004,  # 70-79%
+    4013, 4021, 4029, 4037, 4045, 4054, 4062, 4070, 4078, 4086,  # 80-89%
+    4094, 4103, 4111, 4119, 4127, 4135, 4143, 4152, 4160, 4168   # 90-100%
+])
+
 def decode_e4be(payload: bytes) -> Dict[str, Any]:
     """Decode KegScale Service Data payload for UUID 0xE4BE.
 
@@ -10,8 +31,27 @@ def decode_e4be(payload: bytes) -> Dict[str, Any]:
     - Battery: byte[2] (single byte) OR bytes[17:19] as millivolts
     - Weight (raw): 32-bit little-endian signed at bytes [13:17]
     """
-    out: Dict[str, Any] = {}
     n = len(payload)
+    if n >= _E4BE_FULL.size:
+        # Fast path: every field is present, so unpack them all in one call
+        battery_raw_byte, temp_raw_byte, weight_raw, battery_mv, temp_raw_word = _E4BE_FULL.unpack_from(payload)
+        temp_celsius = temp_raw_word / 100.0
+        return {
+            "temp_c_byte": temp_raw_byte / 10.0,
+            "temp_f_byte": celsius_to_fahrenheit(temp_raw_byte / 10.0),
+            "temp_raw_word": temp_raw_word,
+            "temp_c": temp_celsius,
+            "temp_f": celsius_to_fahrenheit(temp_celsius),
+            "battery_raw_byte": battery_raw_byte,
+            "battery_mv": battery_mv,
+            "battery_percentage": mv_to_battery_percentage(battery_mv),
+            "weight_raw": weight_raw,
+            "weight_grams": weight_raw,
+            "weight_kg": weight_raw / 1000.0,
+            "weight_pounds": weight_raw * 0.00220462,
+        }
+
+    out: Dict[str, Any] = {}
 
     # Temperature decoding - try both methods
     if n > 5:
@@ -22,7 +62,7 @@ def decode_e4be(payload: bytes) -> Dict[str, Any]:
     
     # Enhanced temperature decoding (2-byte, centi-degrees)
     if n >= 21:
-        temp_raw_word = struct.unpack('<h', payload[19:21])[0]
+        temp_raw_word = _S_h.unpack_from(payload, 19)[0]
         out["temp_raw_word"] = temp_raw_word
         temp_celsius = temp_raw_word / 100.0
         out["temp_c"] = temp_celsius
@@ -35,13 +75,13 @@ def decode_e4be(payload: bytes) -> Dict[str, Any]:
     
     # Enhanced battery decoding (2-byte millivolts)
     if n >= 19:
-        battery_mv = struct.unpack('<H', payload[17:19])[0]
+        battery_mv = _S_H.unpack_from(payload, 17)[0]
         out["battery_mv"] = battery_mv
         out["battery_percentage"] = mv_to_battery_percentage(battery_mv)
 
     # Weight raw 32-bit little-endian signed at bytes 13..16 (slice [13:17])
     if n > 16:
-        weight_raw = int.from_bytes(payload[13:17], "little", signed=True)
+        weight_raw = _S_I.unpack_from(payload, 13)[0]
         out["weight_raw"] = weight_raw
         out["weight_grams"] = weight_raw
         out["weight_kg"] = weight_raw / 1000.0
@@ -54,23 +94,10 @@ def mv_to_battery_percentage(millivolts: int) -> int:
     Convert millivolt reading to battery percentage.
     Uses the exact lookup table from the KegMaster app.
     """
-    battery_voltage_table = [
-        3165, 3246, 3293, 3327, 3353, 3374, 3392, 3408, 3422, 3434,  # 0-9%
-        3445, 3455, 3465, 3473, 3481, 3489, 3496, 3502, 3506, 3514,  # 10-19%
-        3522, 3531, 3539, 3547, 3555, 3563, 3571, 3580, 3588, 3596,  # 20-29%
-        3604, 3612, 3620, 3629, 3637, 3645, 3653, 3661, 3669, 3678,  # 30-39%
-        3686, 3694, 3702, 3710, 3718, 3727, 3735, 3743, 3751, 3759,  # 40-49%
-        3767, 3776, 3784, 3792, 3800, 3808, 3817, 3825, 3833, 3841,  # 50-59%
-        3849, 3857, 3866, 3874, 3882, 3890, 3898, 3906, 3915, 3923,  # 60-69%
-        3931, 3939, 3947, 3955, 3964, 3972, 3980, 3988, 3996, 4004,  # 70-79%
-        4013, 4021, 4029, 4037, 4045, 4054, 4062, 4070, 4078, 4086,  # 80-89%
-        4094, 4103, 4111, 4119, 4127, 4135, 4143, 4152, 4160, 4168   # 90-100%
-    ]
-    
     if millivolts < 3165:
         return 0
     
-    for i, voltage in enumerate(battery_voltage_table):
+    for i, voltage in enumerate(_BAT_TABLE):
         if millivolts < voltage:
             return i
     
@@ -80,7 +107,7 @@ def celsius_to_fahrenheit(celsius: float) -> float:
     """Convert Celsius to Fahrenheit using KegMaster app formula."""
     return (9 * celsius / 5) + 32
 
-def linear_weight_kg(weight_raw: int, tare: int = 0, scale: float = -1.0) -> float:
+def linear_weight_kg(weight_raw: float, tare: int = 0, scale: float = -1.0) -> float:
     """Convert raw signed reading into kg using a linear model.
     Default scale=-1.0 reflects that raw decreases as real weight increases.
     Calibrate 'tare' and 'scale' from two known points.
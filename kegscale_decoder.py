@@ -5,46 +5,81 @@ Decodes KegScale BLE beacon data for weight, battery percentage, and temperature
 Based on logic extracted from the KegMaster Android app.
 """
 
+import argparse
+import array
 import asyncio
 import json
 import logging
+import struct
+import sys
+from bisect import bisect_right
 from datetime import datetime
 from bleak import BleakScanner
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib encoder
+    orjson = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+KEGSCALE_SERVICE_UUID = "0000e4be-0000-1000-8000-00805f9b34fb"
+
+# Calibration for the linear_weight_kg formula: (tare - weight_raw) * scale
+DEFAULT_SCALE = 0.000000045885  # kg per raw unit
+
+# Adjusted tare based on your empty scale readings (~-83,951,272)
+# This should make empty scale read 0kg
+ADJUSTED_TARE = -83951272  # Based on your current empty scale reading
+
+_S_I32_LE = struct.Struct("<i")
+_S_U16_LE = struct.Struct("<H")
+# Full 21-byte frame: weight i32 @12, (pad @16), battery u16 @17, temperature i16 @19
+_S_FULL_FRAME = struct.Struct("<12xixHh")
+
+# Battery voltage to percentage lookup table from KegMaster app.
+# Sorted millivolt thresholds; the index of a threshold is its percentage.
+_BATTERY_VOLTAGES = (
+    3165, 3246, 3293, 3327, 3353, 3374, 3392, 3408, 3422, 3434,
+    3445, 3455, 3465, 3473, 3481, 3489, 3496, 3502, 3506, 3514,
+    3522, 3531, 3539, 3547, 3555, 3563, 3571, 3580, 3588, 3596,
+    3604, 3612, 3620, 3629, 3637, 3645, 3653, 3661, 3669, 3678,
+    3686, 3694, 3702, 3710, 3718, 3727, 3735, 3743, 3751, 3759,
+    3767, 3776, 3784, 3792, 3800, 3808, 3817, 3825, 3833, 3841,
+    3849, 3857, 3866, 3874, 3882, 3890, 3898, 3906, 3915, 3923,
+    3931, 3939, 3947, 3955, 3964, 3972, 3980, 3988, 3996, 4004,
+    4013, 4021, 4029, 4037, 4045, 4054, 4062, 4070, 4078, 4086,
+    4094, 4103, 4111, 4119, 4127, 4135, 4143, 4152, 4160, 4168
+)
+
+# Flat percentage table indexed by (millivolts - 3165), covering every
+# integer millivolt reading between the first and last threshold.
+_BATTERY_LUT = bytes(
+    bisect_right(_BATTERY_VOLTAGES, mv)
+    for mv in range(_BATTERY_VOLTAGES[0], _BATTERY_VOLTAGES[-1])
+)
+
+# Fahrenheit for centi-degree readings in -50.00..125.00°C, indexed by
+# (raw - _TEMP_LUT_MIN) and rounded exactly as KegScaleDecoder.celsius_to_fahrenheit does.
+_TEMP_LUT_MIN = -5000
+_TEMP_LUT_MAX = 12500
+_F_FROM_CENTI = array.array('d', (
+    round((9 * (raw / 100.0) / 5) + 32, 1)
+    for raw in range(_TEMP_LUT_MIN, _TEMP_LUT_MAX + 1)
+))
+
+
+def _dumps_indented(obj):
+    """Serialize to 2-space indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
 
 class KegScaleDecoder:
-    def __init__(self):
-        self.battery_voltage_table = self._create_battery_table()
-    
-    def _create_battery_table(self):
-        """
-        Battery voltage to percentage lookup table from KegMaster app.
-        Maps millivolt readings to battery percentage.
-        """
-        table = []
-        voltages = [
-            3165, 3246, 3293, 3327, 3353, 3374, 3392, 3408, 3422, 3434,
-            3445, 3455, 3465, 3473, 3481, 3489, 3496, 3502, 3506, 3514,
-            3522, 3531, 3539, 3547, 3555, 3563, 3571, 3580, 3588, 3596,
-            3604, 3612, 3620, 3629, 3637, 3645, 3653, 3661, 3669, 3678,
-            3686, 3694, 3702, 3710, 3718, 3727, 3735, 3743, 3751, 3759,
-            3767, 3776, 3784, 3792, 3800, 3808, 3817, 3825, 3833, 3841,
-            3849, 3857, 3866, 3874, 3882, 3890, 3898, 3906, 3915, 3923,
-            3931, 3939, 3947, 3955, 3964, 3972, 3980, 3988, 3996, 4004,
-            4013, 4021, 4029, 4037, 4045, 4054, 4062, 4070, 4078, 4086,
-            4094, 4103, 4111, 4119, 4127, 4135, 4143, 4152, 4160, 4168
-        ]
-        
-        for i, voltage in enumerate(voltages):
-            table.append((voltage, i))
-        
-        return table
-    
     def mv_to_battery_percentage(self, millivolts):
         """
         Convert millivolt reading to battery percentage.
@@ -52,12 +87,9 @@ class KegScaleDecoder:
         """
         if millivolts < 3165:
             return 0
-        
-        for voltage, percentage in self.battery_voltage_table:
-            if millivolts < voltage:
-                return percentage
-        
-        return 100
+        if millivolts >= 4168:
+            return 100
+        return _BATTERY_LUT[millivolts - 3165]
     
     def celsius_to_fahrenheit(self, celsius, round_digits=True, decimal_places=1):
         """
@@ -77,6 +109,21 @@ class KegScaleDecoder:
             return round(celsius, decimal_places)
         return celsius
     
+    def grams(self, kg):
+        """Convert kilograms to grams."""
+        return kg * 1000.0
+    
+    def pounds(self, kg):
+        """Convert kilograms to pounds."""
+        return kg * 2.20462
+    
+    def with_tare(self, weight_raw, tare):
+        """
+        Calibrated kilograms for a raw reading against a different tare,
+        e.g. the original 118_295 baseline.
+        """
+        return (tare - weight_raw) * DEFAULT_SCALE
+    
     def calculate_weight_remaining(self, start_total_weight, start_gas_weight, current_weight):
         """
         Calculate remaining weight using KegMaster app logic.
@@ -85,69 +132,61 @@ class KegScaleDecoder:
         remaining = start_gas_weight - weight_consumed
         return max(0, min(remaining, start_gas_weight))
     
-    def decode_kegscale_beacon(self, payload):
+    def decode_kegscale_beacon(self, payload, include_raw=False):
         """
         Decode KegScale BLE beacon payload.
         
         Based on analysis of KegMaster app and your existing Python decoder.
         Extracts weight, battery, and temperature from the beacon data.
+        The timestamp, raw_payload and device_info fields are only filled
+        in when include_raw is set, e.g. for a full JSON dump.
         """
-        decoded = {
-            "timestamp": datetime.now().isoformat(),
-            "raw_payload": payload.hex(),
-            "payload_length": len(payload)
-        }
+        n = len(payload)
+        if include_raw:
+            decoded = {
+                "timestamp": datetime.now().isoformat(),
+                "raw_payload": payload.hex(),
+                "payload_length": n
+            }
+        else:
+            decoded = {"payload_length": n}
         
-        if len(payload) < 17:
+        if n < 17:
             decoded["error"] = "Payload too short"
             return decoded
         
         try:
-            # Extract raw weight (bytes 12-16, little endian, signed)
+            # Weight (bytes 12-16, signed), battery mV (bytes 17-19) and temperature
+            # (bytes 19-21, signed), all little endian. Full frames are read in one call.
             # Analysis shows bytes 12-16 give more reasonable values than 13-17
-            weight_raw = int.from_bytes(payload[12:16], "little", signed=True)
-            decoded["weight_raw"] = weight_raw
-            
-            # Apply calibration from your existing constants
-            DEFAULT_SCALE = 0.000000045885  # kg per raw unit
-            
-            # Adjusted tare based on your empty scale readings (~-83,951,272)
-            # This should make empty scale read 0kg
-            ADJUSTED_TARE = -83951272  # Based on your current empty scale reading
-            
-            # Use your linear_weight_kg formula: (tare - weight_raw) * scale
-            calibrated_kg = (ADJUSTED_TARE - weight_raw) * DEFAULT_SCALE
-            decoded["weight_kg_calibrated"] = calibrated_kg
-            decoded["weight_grams_calibrated"] = calibrated_kg * 1000.0
-            decoded["weight_pounds_calibrated"] = calibrated_kg * 2.20462
+            if n >= 21:
+                weight_raw, battery_raw, temp_raw = _S_FULL_FRAME.unpack_from(payload)
+            else:
+                weight_raw = _S_I32_LE.unpack_from(payload, 12)[0]
+                battery_raw = _S_U16_LE.unpack_from(payload, 17)[0] if n >= 19 else None
+                temp_raw = None
             
-            # Also show with original tare for comparison
-            original_calibrated = (118_295 - weight_raw) * DEFAULT_SCALE
-            decoded["weight_kg_original_tare"] = original_calibrated
-            
-            # Also keep raw conversions for comparison
-            decoded["weight_grams"] = weight_raw  # Raw value
-            decoded["weight_kg"] = weight_raw / 1000.0
-            decoded["weight_pounds"] = weight_raw * 0.00220462
+            decoded["weight_raw"] = weight_raw
+            # Calibrated kg only; use grams()/pounds()/with_tare() for other encodings
+            decoded["weight_kg"] = (ADJUSTED_TARE - weight_raw) * DEFAULT_SCALE
             
-            # Extract battery voltage (bytes 17-19, little endian)
-            if len(payload) >= 19:
-                battery_raw = int.from_bytes(payload[17:19], "little", signed=False)
+            if battery_raw is not None:
                 decoded["battery_raw"] = battery_raw
                 decoded["battery_mv"] = battery_raw
                 decoded["battery_percentage"] = self.mv_to_battery_percentage(battery_raw)
             
-            # Extract temperature (bytes 19-21, little endian, signed)
-            if len(payload) >= 21:
-                temp_raw = int.from_bytes(payload[19:21], "little", signed=True)
+            if temp_raw is not None:
                 decoded["temperature_raw"] = temp_raw
                 # Temperature is likely in centidegrees Celsius (1/100th of a degree)
                 temp_celsius = temp_raw / 100.0
                 decoded["temperature_celsius"] = temp_celsius
-                decoded["temperature_fahrenheit"] = self.celsius_to_fahrenheit(temp_celsius)
+                if _TEMP_LUT_MIN <= temp_raw <= _TEMP_LUT_MAX:
+                    decoded["temperature_fahrenheit"] = _F_FROM_CENTI[temp_raw - _TEMP_LUT_MIN]
+                else:
+                    decoded["temperature_fahrenheit"] = self.celsius_to_fahrenheit(temp_celsius)
             
-            # Additional fields that might be present
-            if len(payload) >= 13:
+            # Additional fields (payload is at least 17 bytes here)
+            if include_raw:
                 decoded["device_info"] = payload[0:13].hex()
             
         except Exception as e:
@@ -157,11 +196,17 @@ class KegScaleDecoder:
 
 
 class KegScaleBLEScanner:
-    def __init__(self, device_filter=None):
+    def __init__(self, device_filter=None, verbose=False):
         self.decoder = KegScaleDecoder()
         self.device_filter = device_filter
+        self.verbose = verbose
         self.scan_count = 0
         self.kegscale_count = 0
+        self._last_payload = {}  # device address -> last KegScale payload seen
+        self._target_uuid = KEGSCALE_SERVICE_UUID
+        self._accepted_uuids = frozenset({KEGSCALE_SERVICE_UUID, KEGSCALE_SERVICE_UUID[4:8]})
+        # One long-lived scanner, reused by every scan() call
+        self._scanner = BleakScanner(detection_callback=self.detection_callback)
     
     def detection_callback(self, device: BLEDevice, advertisement_data: AdvertisementData):
         """
@@ -169,43 +214,56 @@ class KegScaleBLEScanner:
         """
         self.scan_count += 1
         
-        # Filter for KegScale devices by checking for service data with the target UUID
-        target_service_uuid = "0000e4be-0000-1000-8000-00805f9b34fb"
-        
-        # Check if this device has KegScale service data
         service_data = advertisement_data.service_data
-        has_kegscale_service = False
-        kegscale_data = None
+        if not service_data:
+            return
         
-        # Check for KegScale service data
-        if service_data:
+        # Bleak keys service data by the lowercase UUID string, so a direct
+        # lookup almost always hits; only scan the keys when it doesn't.
+        kegscale_data = service_data.get(self._target_uuid)
+        if kegscale_data is None:
+            accepted = self._accepted_uuids
             for uuid, data in service_data.items():
-                if str(uuid).lower() == target_service_uuid.lower():
-                    has_kegscale_service = True
+                if str(uuid).lower() in accepted:
                     kegscale_data = data
                     break
         
         # Only process devices with the KegScale service data
-        if not has_kegscale_service:
+        if not kegscale_data:
             return
         
-        # Process the KegScale service data we found
-        if kegscale_data:
-            self.kegscale_count += 1
-            decoded = self.decoder.decode_kegscale_beacon(kegscale_data)
-            print(f"\n--- KegScale Beacon #{self.kegscale_count} (Total Scan #{self.scan_count}) ---")
-            print(f"Device: {device.name} ({device.address})")
-            print(f"RSSI: {advertisement_data.rssi} dBm")
-            print("Decoded KegScale Data:")
-            print(json.dumps(decoded, indent=2))
+        # Re-advertisements of an unchanged sample carry identical bytes
+        if self._last_payload.get(device.address) == kegscale_data:
+            return
+        self._last_payload[device.address] = kegscale_data
         
-        # Also check manufacturer data in case KegScale uses it
-        manufacturer_data = advertisement_data.manufacturer_data
-        if manufacturer_data:
-            for company_id, data in manufacturer_data.items():
-                decoded = self.decoder.decode_kegscale_beacon(data)
-                print(f"\nManufacturer Data (0x{company_id:04X}):")
-                print(json.dumps(decoded, indent=2))
+        self.kegscale_count += 1
+        decoded = self.decoder.decode_kegscale_beacon(kegscale_data, include_raw=self.verbose)
+        if not self.verbose:
+            sys.stdout.write(self.format_summary(device, advertisement_data.rssi, decoded) + "\n")
+            return
+        
+        sys.stdout.write(
+            f"\n--- KegScale Beacon #{self.kegscale_count} (Total Scan #{self.scan_count}) ---\n"
+            f"Device: {device.name} ({device.address})\n"
+            f"RSSI: {advertisement_data.rssi} dBm\n"
+            f"Decoded KegScale Data:\n{_dumps_indented(decoded)}\n"
+        )
+    
+    def format_summary(self, device, rssi, decoded):
+        """
+        One-line labeled summary of a decoded beacon for non-verbose output.
+        """
+        parts = [f"#{self.kegscale_count} mac={device.address} rssi={rssi}"]
+        if "error" in decoded:
+            parts.append(f"error={decoded['error']!r}")
+        if "weight_kg" in decoded:
+            parts.append(f"weight_kg={decoded['weight_kg']:.3f}")
+        if "battery_percentage" in decoded:
+            parts.append(f"battery={decoded['battery_percentage']}%")
+        if "temperature_celsius" in decoded:
+            parts.append(f"temp_c={decoded['temperature_celsius']:.1f}")
+        return " ".join(parts)
     
     async def scan(self, duration=30):
         """
@@ -214,26 +272,41 @@ class KegScaleBLEScanner:
         print(f"Starting KegScale BLE scan for {duration} seconds...")
         print("Looking for KegScale beacon data...")
         
-        scanner = BleakScanner(detection_callback=self.detection_callback)
-        
+        await self._scanner.start()
         try:
-            await scanner.start()
             await asyncio.sleep(duration)
-            await scanner.stop()
         except KeyboardInterrupt:
             print("\nScan interrupted by user")
-            await scanner.stop()
+        finally:
+            await self._scanner.stop()
         
         print(f"\nScan completed. Total devices detected: {self.scan_count}, KegScale beacons: {self.kegscale_count}")
 
 
+async def _flush_periodically(interval=0.1):
+    """Flush stdout on a timer so per-beacon writes are coalesced into few syscalls."""
+    while True:
+        await asyncio.sleep(interval)
+        sys.stdout.flush()
+
+
 async def main():
     """
     Main function to run the KegScale BLE scanner.
     """
+    parser = argparse.ArgumentParser(description="KegScale BLE beacon decoder")
+    parser.add_argument("--verbose", action="store_true", help="Dump every decoded beacon as indented JSON")
+    args = parser.parse_args()
+    
     # Use service UUID filtering instead of MAC address (works on macOS)
-    scanner = KegScaleBLEScanner()  # No device filter needed - we filter by service UUID
-    await scanner.scan(duration=120)  # Scan for 120 seconds
+    scanner = KegScaleBLEScanner(verbose=args.verbose)  # No device filter needed - we filter by service UUID
+    sys.stdout.reconfigure(line_buffering=False, write_through=False)
+    flusher = asyncio.create_task(_flush_periodically())
+    try:
+        await scanner.scan(duration=120)  # Scan for 120 seconds
+    finally:
+        flusher.cancel()
+        sys.stdout.flush()
 
 
 if __name__ == "__main__":
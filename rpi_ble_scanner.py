@@ -2,11 +2,16 @@
 from __future__ import annotations
 import argparse
 import asyncio
-import binascii
+import signal
+import struct
+import sys
+import time
+from bisect import bisect_left, insort
 from collections import deque
 from datetime import datetime
+from functools import lru_cache
 from statistics import median
-from typing import Dict, Any, List, Optional
+from typing import Dict, List, Optional, Tuple
 from bleak import BleakScanner
 
 from ble_scanrecord import parse_scan_record
@@ -17,114 +22,398 @@ UUID_E4BE = "0000e4be-0000-1000-8000-00805f9b34fb"
 DEFAULT_TARE = 118_295
 DEFAULT_SCALE = 0.000000045885  # kg per raw unit
 
+# --binlog record: epoch_ms, weight_raw, temp_raw_word (centi-deg C), seq, status, rssi.
+# Fields missing from a short frame are written as 0.
+_BINLOG_REC = struct.Struct("<QihBHb")
+# seq (byte 9), marker12 (byte 12) and status (u16 LE at 16), unpacked from offset 9
+_EXTRA_ALL = struct.Struct("<BxxBxxxH")
+
+_MAC_TRANS = str.maketrans("ABCDEF", "abcdef", ":")
+
+@lru_cache(maxsize=256)
 def _norm_mac(s: str) -> str:
-    return s.replace(":", "").lower()
+    # The same few addresses recur on every advert, so normalize each only once
+    return s.translate(_MAC_TRANS)
+
+@lru_cache(maxsize=64)
+def _lower_key(k: str) -> str:
+    # BLE stacks hand back the same handful of UUID strings, so cache the lowering.
+    return sys.intern(k.lower())
+
+def _build_uuid_matcher(uuid_filter: str|None):
+    """Return a predicate for (already lowercased) service-data keys, with the filter normalized once."""
+    if uuid_filter is None:
+        return lambda k: True
+    u = sys.intern(uuid_filter.lower())
+    suf = u[-8:]
+    return lambda k: k == u or k.endswith(suf)
 
-def _merge_service_data(adv_obj) -> Dict[str, bytes]:
+@lru_cache(maxsize=256)
+def _parsed_service_data(raw: bytes) -> tuple:
+    """Service-data entries of a raw AD frame as ((lowercase uuid, payload), ...).
+
+    Advertisers repeat identical frames many times a second, so repeats are
+    served from the cache; the tuple result is immutable and safe to share.
+    """
+    sr = parse_scan_record(raw)
+    return tuple((_lower_key(str(u)), payload) for u, payload in sr.service_data.items())
+
+def _merge_service_data(adv_obj, want_key: str|None = None) -> Dict[str, bytes]:
+    """Merge Bleak's service data with any parsed from raw frames, keyed by lowercase UUID string.
+
+    When ``want_key`` is already present in Bleak's own parse, the raw frames
+    are not walked at all.
+    """
     merged: Dict[str, bytes] = {}
-    for k, v in (adv_obj.service_data or {}).items():
-        merged[str(k)] = bytes(v)
-    for attr in ("advertisement_bytes", "scan_response"):
-        raw = getattr(adv_obj, attr, None)
-        if raw:
-            sr = parse_scan_record(bytes(raw))
-            for u, payload in sr.service_data.items():
-                merged[str(u)] = bytes(payload)
+    sd_map = adv_obj.service_data
+    if sd_map:
+        for k, v in sd_map.items():
+            merged[_lower_key(str(k))] = v if type(v) is bytes else bytes(v)
+        if want_key is not None and want_key in merged:
+            return merged
+    adv_raw = getattr(adv_obj, "advertisement_bytes", None)
+    if adv_raw:
+        adv_raw = bytes(adv_raw)
+        merged.update(_parsed_service_data(adv_raw))
+    scan_raw = getattr(adv_obj, "scan_response", None)
+    if scan_raw:
+        scan_raw = bytes(scan_raw)
+        # Some adapters repeat the primary frame as the scan response; it adds nothing.
+        if scan_raw != adv_raw:
+            merged.update(_parsed_service_data(scan_raw))
     return merged
 
-def _extract_extra_fields(payload: bytes) -> Dict[str, Any]:
-    out: Dict[str, Any] = {}
-    if len(payload) > 9:
-        out["seq"] = payload[9]
-    if len(payload) > 12:
-        out["marker12"] = payload[12]
-    if len(payload) > 17:
-        out["status"] = int.from_bytes(payload[16:18], "little", signed=False)
-    return out
-
-def _hampel_filter(values: List[int], k: int = 7, nsigma: float = 3.5) -> Optional[float]:
-    """Return the latest value if it's within nsigma*MAD of the window median; else None."""
-    if len(values) < 3:
-        return float(values[-1]) if values else None
-    m = median(values)
-    abs_dev = [abs(x - m) for x in values]
-    mad = median(abs_dev) or 1.0
-    x = values[-1]
-    if abs(x - m) <= nsigma * 1.4826 * mad:
-        return float(x)
-    return None
-
-def make_callback(mac_target: str|None, uuid_filter: str|None, tare: int, scale: float, smooth_n: int, print_raw: bool, require_marker12: Optional[int], outlier_window: int, nsigma: float):
+# Formats of the optional fields emitted per E4BE packet, in output order;
+# the callback supplies values as (temp_c, seq, battery_raw, marker12, status, weight_raw).
+_FIELDS = (
+    "temp_c={:.1f}",
+    "seq={}",
+    "battery_raw={}",
+    "marker12=0x{:02x}",
+    "status=0x{:04x}",
+    "weight_raw={}",
+)
+
+def _extract_extra_fields(payload: bytes) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """Return (seq, marker12, status); fields past the end of a short payload are None."""
+    n = len(payload)
+    if n > 17:
+        return _EXTRA_ALL.unpack_from(payload, 9)
+    return (
+        payload[9] if n > 9 else None,
+        payload[12] if n > 12 else None,
+        None,
+    )
+
+class RollingMean:
+    """Mean of the last ``n`` values, kept as a running sum so each push is O(1).
+
+    Integer inputs keep the sum exact, so no drift accumulates over long runs.
+    """
+
+    def __init__(self, n: int):
+        self.buf: deque = deque(maxlen=n)
+        self.sum = 0
+
+    def __len__(self) -> int:
+        return len(self.buf)
+
+    def push(self, x) -> None:
+        buf = self.buf
+        if len(buf) == buf.maxlen:
+            self.sum -= buf[0]
+        buf.append(x)
+        self.sum += x
+
+    def mean(self) -> float:
+        return self.sum / len(self.buf)
+
+class RollingHampel:
+    """Hampel outlier test over a sliding window of raw readings.
+
+    The window is kept both in arrival order (for eviction) and sorted (via
+    bisect), so the median is an index lookup and the MAD is a k-th smallest
+    selection over the two sorted deviation runs either side of the median.
+    Results match taking statistics.median of the window and of |x - median|.
+    """
+
+    def __init__(self, size: int):
+        self.order: deque = deque()
+        self.size = size
+        self.sorted: List[int] = []
+
+    def push(self, x: int) -> None:
+        if len(self.order) == self.size:
+            old = self.order.popleft()
+            del self.sorted[bisect_left(self.sorted, old)]
+        self.order.append(x)
+        insort(self.sorted, x)
+
+    def median(self) -> float:
+        s = self.sorted
+        mid = len(s) // 2
+        if len(s) % 2:
+            return s[mid]
+        return (s[mid - 1] + s[mid]) / 2
+
+    def _kth_deviation(self, m: float, p: int, k: int) -> float:
+        # Deviations below the median, m - s[p-1-i], and from the median up,
+        # s[p+j] - m, are both ascending; binary-search how many of the k+1
+        # smallest come from the lower run.
+        s = self.sorted
+        n_hi = len(s) - p
+        lo, hi = max(0, k + 1 - n_hi), min(k + 1, p)
+        while lo < hi:
+            a = (lo + hi) // 2
+            b = k + 1 - a
+            if b > 0 and m - s[p - 1 - a] < s[p + b - 1] - m:
+                lo = a + 1
+            else:
+                hi = a
+        b = k + 1 - lo
+        below = m - s[p - lo] if lo > 0 else None
+        above = s[p + b - 1] - m if b > 0 else None
+        if below is None:
+            return above
+        if above is None:
+            return below
+        return max(below, above)
+
+    def mad(self, m: float) -> float:
+        n = len(self.sorted)
+        p = bisect_left(self.sorted, m)
+        mid = n // 2
+        if n % 2:
+            return self._kth_deviation(m, p, mid)
+        return (self._kth_deviation(m, p, mid - 1) + self._kth_deviation(m, p, mid)) / 2
+
+    def test(self, x: int, nsigma: float = 3.5) -> Optional[float]:
+        """Add x; return it if it's within nsigma*MAD of the window median, else None."""
+        self.push(x)
+        if len(self.order) < 3:
+            return float(x)
+        m = self.median()
+        mad = self.mad(m) or 1.0
+        if abs(x - m) <= nsigma * 1.4826 * mad:
+            return float(x)
+        return None
+
+def read_binlog(path: str):
+    """Yield (epoch_ms, weight_raw, temp_raw_word, seq, status, rssi) tuples from a --binlog file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    usable = len(data) - len(data) % _BINLOG_REC.size
+    yield from _BINLOG_REC.iter_unpack(memoryview(data)[:usable])
+
+_ts_cache = [0, ""]  # (epoch second, formatted timestamp) reused within the same second
+
+def _ts_now(now: Optional[float] = None) -> str:
+    """Seconds-resolution ISO timestamp of ``now`` (default: the current time),
+    formatted at most once per wall-clock second."""
+    now_int = int(time.time() if now is None else now)
+    if now_int != _ts_cache[0]:
+        _ts_cache[0] = now_int
+        _ts_cache[1] = datetime.fromtimestamp(now_int).isoformat(timespec="seconds")
+    return _ts_cache[1]
+
+async def _flush_periodically(interval: float = 0.1, extra=None):
+    """Flush stdout (and ``extra``, e.g. the binlog) on a timer so per-packet
+    writes are coalesced into few syscalls without sitting in a buffer for long."""
+    while True:
+        await asyncio.sleep(interval)
+        sys.stdout.flush()
+        if extra is not None:
+            extra.flush()
+
+def make_callback(mac_target: str|None, uuid_filter: str|None, tare: int, scale: float, smooth_n: int, print_raw: bool, require_marker12: Optional[int], outlier_window: int, nsigma: float, binlog=None):
     mac_norm = _norm_mac(mac_target) if mac_target else None
-    window_kg = deque(maxlen=max(1, smooth_n))
-    window_raw = deque(maxlen=max(3, outlier_window))
+    # Accepted raw readings; the linear calibration is applied once to their mean.
+    window_ok = RollingMean(max(1, smooth_n))
+    hampel = RollingHampel(max(3, outlier_window))
+    uuid_full = sys.intern(uuid_filter.lower()) if uuid_filter else None
+    match = _build_uuid_matcher(uuid_filter)
+    # Merged keys are lowercase, so the lowered filter is the only exact key to probe;
+    # whether it is an E4BE key is known here rather than re-checked per packet.
+    candidate_keys = ((uuid_full, uuid_full == UUID_E4BE),) if uuid_full else ()
+    _write = sys.stdout.write
+    _pack = _BINLOG_REC.pack
+    last_seq: Dict[Tuple[str, Optional[int]], int] = {}  # (address, frame marker) -> seq
 
-    def cb(device, adv):
-        if mac_norm and _norm_mac(device.address) != mac_norm:
+    def cb(device, adv, rx_time: Optional[float] = None):
+        addr = device.address
+        if mac_norm and _norm_mac(addr) != mac_norm:
             return
-        service_data = _merge_service_data(adv)
-
-        entries = []
-        if uuid_filter:
-            suf = uuid_filter[-8:].lower()
-            for k, v in service_data.items():
-                kl = k.lower()
-                if kl == uuid_filter.lower() or kl.endswith(suf):
-                    entries.append((k, v))
+        service_data = _merge_service_data(adv, want_key=uuid_full)
+
+        for key, is_e4be in candidate_keys:
+            payload = service_data.get(key)
+            if payload is not None:
+                entries = [(key, payload, is_e4be)]
+                break
         else:
-            entries = list(service_data.items())
+            entries = [(k, v, k == UUID_E4BE) for k, v in service_data.items() if match(k)]
         if not entries:
             return
 
-        for uuid_str, payload in entries:
-            if not uuid_str.lower().endswith(UUID_E4BE[-8:]):
+        if rx_time is None:
+            rx_time = time.time()
+        ts = _ts_now(rx_time)  # one timestamp per advert, shared by all of its entries
+        rssi = adv.rssi
+        out: List[str] = []  # lines for this advert, written in a single call
+        for uuid_str, payload, is_e4be in entries:
+            if not is_e4be:
+                # Other service data is only worth a line when raw output was requested
+                if print_raw:
+                    out.append(f"{ts} mac={addr} rssi={rssi} uuid={uuid_str} sd={payload.hex()}\n")
                 continue
 
-            decoded = decode_e4be(payload)
-            extra = _extract_extra_fields(payload)
+            seq, marker12, status = _extract_extra_fields(payload)
 
             # Optional marker filter
-            if require_marker12 is not None and extra.get("marker12") != require_marker12:
+            if require_marker12 is not None and marker12 != require_marker12:
                 continue
 
-            parts = []
-            if "temp_c" in decoded and decoded["temp_c"] is not None:
-                parts.append(f"temp_c={decoded['temp_c']:.1f}")
-            if "seq" in extra and extra["seq"] is not None:
-                parts.append(f"seq={extra['seq']}")
-            if "battery_raw" in decoded and decoded["battery_raw"] is not None:
-                parts.append(f"battery_raw={decoded['battery_raw']}")
-            if "marker12" in extra and extra["marker12"] is not None:
-                parts.append(f"marker12=0x{extra['marker12']:02x}")
-            if "status" in extra and extra["status"] is not None:
-                parts.append(f"status=0x{extra['status']:04x}")
+            # Re-broadcasts of the same sample share the vendor seq byte; skip them undecoded.
+            # Frame types carry their own seq, so track it per (address, marker).
+            if seq is not None:
+                seq_key = (addr, marker12)
+                if last_seq.get(seq_key) == seq:
+                    continue
+                last_seq[seq_key] = seq
 
+            decoded = decode_e4be(payload)
             wr = decoded.get("weight_raw")
+
+            if binlog is not None:
+                # Raw record only; filtering and formatting happen offline.
+                binlog.write(_pack(
+                    int(rx_time * 1000),
+                    wr or 0,
+                    decoded.get("temp_raw_word") or 0,
+                    seq or 0,
+                    status or 0,
+                    rssi or 0,
+                ))
+                continue
+
+            values = (decoded.get("temp_c"), seq, decoded.get("battery_raw"), marker12, status, wr)
+            parts = [fmt.format(v) for fmt, v in zip(_FIELDS, values) if v is not None]
+
             kg_inst = None
             avg_kg = None
 
             if wr is not None:
-                parts.append(f"weight_raw={wr}")
-                window_raw.append(wr)
-                wr_ok = _hampel_filter(list(window_raw), k=outlier_window, nsigma=nsigma)
+                wr_ok = hampel.test(wr, nsigma)
                 if wr_ok is not None:
                     kg_inst = linear_weight_kg(int(wr_ok), tare, scale)
-                    window_kg.append(kg_inst)
-                    avg_kg = sum(window_kg) / len(window_kg)
+                    window_ok.push(int(wr_ok))
+                    avg_kg = linear_weight_kg(window_ok.mean(), tare, scale)
                 else:
                     parts.append("filtered=outlier")
 
-            ts = datetime.now().isoformat(timespec="seconds")
-            line = f"{ts} mac={device.address} rssi={adv.rssi} uuid={uuid_str} " + " ".join(parts)
+            line = f"{ts} mac={addr} rssi={rssi} uuid={uuid_str} " + " ".join(parts)
             if kg_inst is not None:
                 if smooth_n > 1:
-                    line += f" weight_kg={kg_inst:.3f} avg_kg={avg_kg:.3f} (n={len(window_kg)})"
+                    line += f" weight_kg={kg_inst:.3f} avg_kg={avg_kg:.3f} (n={len(window_ok)})"
                 else:
                     line += f" weight_kg={kg_inst:.3f}"
-            print(line)
+            if print_raw:
+                line += f" sd={payload.hex()}"
+            out.append(line + "\n")
+        if out:
+            _write("".join(out))
 
     return cb
 
+def _robust_center(values: List[int]) -> float:
+    """Median of the collected raw readings, so a stray glitched packet can't skew it."""
+    return float(median(values))
+
+async def _collect_raw(adapter: str, mac: str, n: int, timeout_s: float) -> List[int]:
+    """Collect up to n distinct raw weight readings from one device's E4BE frames."""
+    mac_norm = _norm_mac(mac)
+    values: List[int] = []
+    done = asyncio.Event()
+    last_seq: Dict[Optional[int], int] = {}  # frame marker -> seq
+
+    def cb(device, adv):
+        if done.is_set() or _norm_mac(device.address) != mac_norm:
+            return
+        payload = _merge_service_data(adv, want_key=UUID_E4BE).get(UUID_E4BE)
+        if payload is None:
+            return
+        seq, marker12, _ = _extract_extra_fields(payload)
+        if seq is not None:
+            if last_seq.get(marker12) == seq:
+                return  # re-broadcast of the sample already counted
+            last_seq[marker12] = seq
+        wr = decode_e4be(payload).get("weight_raw")
+        if wr is not None:
+            values.append(wr)
+            if len(values) >= n:
+                done.set()
+
+    scanner = BleakScanner(detection_callback=cb, adapter=adapter, scanning_mode="active")
+    await scanner.start()
+    try:
+        await asyncio.wait_for(done.wait(), timeout_s)
+    except asyncio.TimeoutError:
+        pass  # use whatever arrived in time
+    finally:
+        await scanner.stop()
+    return values
+
+async def run_calibration(adapter: str, mac: str, known_mass_kg: float, samples: int = 30, timeout_s: float = 6.0):
+    """Two-point calibration: read the empty scale, then KNOWN_MASS_KG on it, and print --tare/--scale."""
+    loop = asyncio.get_running_loop()
+    points: List[float] = []
+    for prompt in ("Remove all weight from the scale", f"Place {known_mass_kg:.3f} kg on the scale"):
+        await loop.run_in_executor(None, input, f"{prompt}, then press Enter... ")
+        values = await _collect_raw(adapter, mac, samples, timeout_s)
+        if not values:
+            print(f"No readings from {mac} within {timeout_s:.1f}s; calibration aborted.")
+            return
+        center = _robust_center(values)
+        print(f"  {len(values)} samples, median raw={center:.1f}")
+        points.append(center)
+
+    empty, loaded = points
+    if loaded == empty:
+        print("Loaded and empty readings are identical; cannot derive a scale.")
+        return
+    # linear_weight_kg computes (tare - raw) * scale
+    scale = known_mass_kg / (empty - loaded)
+    print(f"Calibration result: --tare {round(empty)} --scale {scale:.12g}")
+
+def make_enqueue_callback(queue: asyncio.Queue):
+    """Scanner callback that only hands the advertisement, stamped with its
+    receive time, to the consumer task."""
+    def cb(device, adv):
+        item = (device, adv, time.time())
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Consumer is behind: drop the oldest advert so the newest readings win.
+            queue.get_nowait()
+            queue.put_nowait(item)
+    return cb
+
+def _handle_item(handle, item) -> None:
+    """Run handle on one queued advert; a failure loses only that advert."""
+    try:
+        handle(*item)
+    except Exception as e:
+        print(f"rpi_ble_scanner: error handling advert from {item[0].address}: {e!r}", file=sys.stderr)
+
+async def _consume(queue: asyncio.Queue, handle):
+    while True:
+        _handle_item(handle, await queue.get())
+
+def _drain(queue: asyncio.Queue, handle) -> None:
+    """Process adverts still queued at shutdown instead of dropping them."""
+    while not queue.empty():
+        _handle_item(handle, queue.get_nowait())
+
 async def main():
     ap = argparse.ArgumentParser(description="RPI BLE scanner with Android-style parsing, robust filtering, and calibration.")
     ap.add_argument("--mac", help="Target MAC to filter (e.g., 5C:01:3B:35:92:EE)")
@@ -140,6 +429,7 @@ async def main():
     ap.add_argument("--require-marker12", type=lambda x: int(x,0), default=None, help="Only accept frames where payload[12] == this byte (e.g., 0x0c)")
     ap.add_argument("--outlier-window", type=int, default=15, help="Window size for Hampel filter on raw readings")
     ap.add_argument("--nsigma", type=float, default=3.5, help="Sigma threshold for Hampel outlier rejection")
+    ap.add_argument("--binlog", help="Append fixed-size binary records to FILE instead of printing text lines")
 
     args = ap.parse_args()
 
@@ -147,25 +437,37 @@ async def main():
         if not args.mac:
             print("--mac is required for calibration mode.")
             return
-
-        # Reuse previous calibration routine (omitted here for brevity)
-        # Import at runtime to avoid duplication
-        from rpi_ble_scanner import run_calibration  # type: ignore
         await run_calibration(args.adapter, args.mac, args.calibrate, samples=args.samples, timeout_s=args.timeout)
         return
 
     uuid_filter = None if args.uuid.lower() == "all" else args.uuid
-    cb = make_callback(args.mac, uuid_filter, args.tare, args.scale, args.smooth, args.print_raw, args.require_marker12, args.outlier_window, args.nsigma)
-    scanner = BleakScanner(detection_callback=cb, adapter=args.adapter, scanning_mode="active")
+    sys.stdout.reconfigure(line_buffering=False, write_through=False)
+    binlog = open(args.binlog, "ab") if args.binlog else None
+    handle = make_callback(args.mac, uuid_filter, args.tare, args.scale, args.smooth, args.print_raw, args.require_marker12, args.outlier_window, args.nsigma, binlog=binlog)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+    consumer = asyncio.create_task(_consume(queue, handle))
+    scanner = BleakScanner(detection_callback=make_enqueue_callback(queue), adapter=args.adapter, scanning_mode="active")
     await scanner.start()
     print(f"🔍 rpi_ble_scanner.py listening on {args.adapter}... (Ctrl+C to stop)")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    flusher = asyncio.create_task(_flush_periodically(extra=binlog))
     try:
-        while True:
-            await asyncio.sleep(0.25)
-    except KeyboardInterrupt:
-        pass
+        await stop.wait()
     finally:
+        flusher.cancel()
         await scanner.stop()
+        consumer.cancel()
+        try:
+            await consumer
+        except asyncio.CancelledError:
+            pass
+        _drain(queue, handle)
+        sys.stdout.flush()
+        if binlog is not None:
+            binlog.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -8,30 +8,33 @@ from bleak import BleakScanner
 from bleak.backends.device import BLEDevice
 from bleak.backends.scanner import AdvertisementData
 
+KEGSCALE_SERVICE_UUID = "0000e4be-0000-1000-8000-00805f9b34fb"
+
 async def detection_callback(device: BLEDevice, advertisement_data: AdvertisementData):
     """Show only devices with service data."""
     
     # Only show devices that have service data
-    if advertisement_data.service_data:
+    service_data = advertisement_data.service_data
+    if service_data:
         print(f"\n--- Device with Service Data ---")
         print(f"Name: {device.name}")
         print(f"Address: {device.address}")
         print(f"RSSI: {advertisement_data.rssi} dBm")
         print("Service Data:")
         
-        for uuid, data in advertisement_data.service_data.items():
+        for uuid, data in service_data.items():
             print(f"  UUID: {uuid}")
             print(f"  Data: {data.hex()}")
             print(f"  Length: {len(data)} bytes")
             
-            # Check specifically for KegScale UUID
-            if str(uuid).lower() == "0000e4be-0000-1000-8000-00805f9b34fb":
+            # Check specifically for KegScale UUID; Bleak keys are already lowercase strings
+            if uuid == KEGSCALE_SERVICE_UUID:
                 print("  *** THIS IS THE KEGSCALE UUID! ***")
 
 async def main():
     """Monitor for service data."""
     print("Monitoring for BLE service data...")
-    print("Looking specifically for KegScale UUID: 0000e4be-0000-1000-8000-00805f9b34fb")
+    print(f"Looking specifically for KegScale UUID: {KEGSCALE_SERVICE_UUID}")
     print("Scanning for 30 seconds...\n")
     
     scanner = BleakScanner(detection_callback=detection_callback)
@@ -5,6 +5,8 @@ Test different weight extraction positions from KegScale beacon data.
 
 import struct
 
+_I32_LE = struct.Struct('<i')
+
 def test_weight_positions(hex_payload):
     """Test different byte positions for weight extraction."""
     payload = bytes.fromhex(hex_payload.replace(" ", ""))
@@ -27,19 +29,13 @@ def test_weight_positions(hex_payload):
     print("32-bit signed little-endian extractions:")
     for start, end, desc in positions_to_test:
         if end <= len(payload):
-            try:
-                value = struct.unpack('<i', payload[start:end])[0]
-                print(f"  {desc}: {value:,}")
-            except:
-                print(f"  {desc}: ERROR")
+            value = _I32_LE.unpack_from(payload, start)[0]
+            print(f"  {desc}: {value:,}")
     
     print("\n16-bit signed little-endian extractions:")
-    for i in range(0, len(payload)-1, 2):
-        try:
-            value = struct.unpack('<h', payload[i:i+2])[0]
-            print(f"  bytes {i}-{i+2}: {value}")
-        except:
-            pass
+    # One pass over every aligned pair; a trailing odd byte is left out
+    for i, (value,) in zip(range(0, len(payload), 2), struct.iter_unpack('<h', payload[:len(payload) & ~1])):
+        print(f"  bytes {i}-{i+2}: {value}")
     
     print("\nByte-by-byte (hex and decimal):")
     for i, byte in enumerate(payload):